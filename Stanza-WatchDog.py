@@ -1,149 +1,444 @@
 import os
+import sys
+import math
 import time
+import queue
+import atexit
+import pickle
+import signal
 import subprocess
 import logging
-from threading import Thread, Lock, Semaphore
-from watchdog.observers import Observer
+import logging.handlers
+from collections import OrderedDict
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 from watchdog.events import FileSystemEventHandler
 
+# Pin the OS-native notification backend so the watcher never silently
+# degrades to polling the share
+if sys.platform == "win32":
+    from watchdog.observers.read_directory_changes import WindowsApiObserver as NativeObserver
+elif sys.platform.startswith("linux"):
+    from watchdog.observers.inotify import InotifyObserver as NativeObserver
+elif sys.platform == "darwin":
+    from watchdog.observers.fsevents import FSEventsObserver as NativeObserver
+else:
+    raise ImportError(f"No native file system observer for platform: {sys.platform}")
+
+# Share-mode probe for finished writers (Windows only)
+try:
+    import pywintypes
+    import win32api
+    import win32con
+    import win32file
+    import winerror
+except ImportError:
+    win32api = win32file = None
+
 # Configuration
 STABILITY_THRESHOLD = 10          # Number of consecutive stable checks
+STABLE_CONFIRMATIONS = 3          # Consecutive unchanged polls before a file counts as stable
+CONFIRM_INTERVAL = 2              # Seconds between confirming polls once a file stops changing
 MAX_WAIT_TIME = 600               # Increased to 10 minutes for large files
 INITIAL_CHECK_INTERVAL = 1        # Initial interval between checks (seconds)
 MAX_CONCURRENT_PROCESSES = 5      # Limit concurrent file processing
 MIN_FILE_AGE = 5                  # Minimum file age before processing (seconds)
+POLL_BUDGET = 10                  # Number of size polls placed across the write-duration distribution
+HISTORY_FILE = "stability_history.pkl"  # Sidecar with past (file_size, write_duration) samples
+HISTORY_SIZE = 200                # Samples kept per file extension
+BATCH_WINDOW = 2                  # Seconds to collect stable files into one script run
+SCRIPT_TIMEOUT = 3600             # Script timeout per file (seconds)
+SHARE_PROBE_INTERVAL = 0.05       # Initial wait between share-mode probes (seconds)
+STOP_CHECK_INTERVAL = 60         # Bound on how long a stop signal can go unnoticed (seconds)
+MAX_TRACKED_FILES = 10000         # In-flight file paths remembered for de-duplication
+IGNORE_SUFFIXES = (".tmp", ".crdownload", ".partial", ".part")  # Transient download/copy files
+IGNORE_PREFIXES = ("~$", ".")     # Office lock files and hidden files
+
+# Configure logging: callers only enqueue records, a listener thread does the I/O
+log_queue = queue.SimpleQueue()
+log_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+log_handlers = [
+    logging.FileHandler("file_watcher.log"),
+    logging.StreamHandler()
+]
+for log_handler in log_handlers:
+    log_handler.setFormatter(log_formatter)
+# The queue handler only merges the message arguments; the listener's handlers
+# apply log_formatter, so the line is formatted exactly once
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.getLogger().addHandler(queue_handler)
+logging.getLogger().setLevel(logging.INFO)
+log_listener = logging.handlers.QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+history_lock = Lock()
+
+
+def load_history():
+    """Load the per-extension write-duration history from the sidecar file."""
+    try:
+        with open(HISTORY_FILE, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def record_write_duration(file_path, file_size, duration):
+    """Append a (file_size, write_duration) sample to the rolling history."""
+    ext = os.path.splitext(file_path)[1].lower()
+    with history_lock:
+        history = load_history()
+        samples = history.setdefault(ext, [])
+        samples.append((file_size, duration))
+        del samples[:-HISTORY_SIZE]
+        try:
+            with open(HISTORY_FILE, "wb") as f:
+                pickle.dump(history, f)
+        except OSError as e:
+            logging.warning(f"Could not save stability history: {e}")
+
+
+def compute_poll_schedule(durations, k=POLL_BUDGET):
+    """Place k poll times across the historical write-duration distribution.
+
+    Uses a Gaussian KDE over past durations and the optimal placement
+    recurrence L_i = L_{i-1} + (F(L_{i-1}) - F(L_{i-2})) / p(L_{i-1}),
+    choosing L_1 by bisection so that L_k lands on the 99th percentile.
+    Falls back to a geometric schedule when there is not enough history
+    or the placement breaks down numerically.
+    """
+    if len(durations) >= 2:
+        try:
+            schedule = _kde_poll_schedule(durations, k)
+        except (ArithmeticError, ValueError):
+            schedule = None
+        if schedule:
+            return schedule
+
+    schedule, t, interval = [], 0.0, INITIAL_CHECK_INTERVAL
+    while len(schedule) < k:
+        t += interval
+        schedule.append(t)
+        interval = min(interval * 1.5, STABILITY_THRESHOLD)
+    return schedule
+
+
+def _kde_poll_schedule(durations, k):
+    """KDE-based placement for compute_poll_schedule, or None if it does not converge."""
+    n = len(durations)
+    mean = sum(durations) / n
+    std = math.sqrt(sum((d - mean) ** 2 for d in durations) / n)
+    bandwidth = max(1.06 * std * n ** -0.2, INITIAL_CHECK_INTERVAL)
+
+    def pdf(x):
+        return sum(math.exp(-0.5 * ((x - d) / bandwidth) ** 2) for d in durations) / (
+            n * bandwidth * math.sqrt(2 * math.pi))
+
+    def cdf(x):
+        return sum(0.5 * (1 + math.erf((x - d) / (bandwidth * math.sqrt(2)))) for d in durations) / n
+
+    def ppf(q):
+        low, high = 0.0, max(durations) + 4 * bandwidth
+        while high - low > 0.01:
+            mid = (low + high) / 2
+            low, high = (mid, high) if cdf(mid) < q else (low, mid)
+        return high
+
+    lower, upper = ppf(0.001), ppf(0.99)
+
+    def place(first):
+        points = [lower, first]
+        while len(points) <= k:
+            density = pdf(points[-1])
+            if density <= 0:
+                return None
+            step = (cdf(points[-1]) - cdf(points[-2])) / density
+            # Tightly clustered histories make the recurrence diverge; stop before the
+            # kernel terms overflow
+            if not math.isfinite(step) or points[-1] + step > upper:
+                return None
+            points.append(points[-1] + step)
+        return points[1:]
+
+    lo, hi = lower, upper
+    schedule = None
+    for _ in range(50):
+        first = (lo + hi) / 2
+        candidate = place(first)
+        if candidate is None:
+            hi = first
+        else:
+            lo = first
+            schedule = candidate
+    if not schedule:
+        return None
+
+    # Keep polls far enough apart for an unchanged size to mean something
+    spaced, last = [], 0.0
+    for t in schedule:
+        last = max(t, last + INITIAL_CHECK_INTERVAL)
+        spaced.append(last)
+    return spaced
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("file_watcher.log"),
-        logging.StreamHandler()
-    ]
-)
 
 class RobustFolderWatchHandler(FileSystemEventHandler):
     def __init__(self, script_path, is_python):
         self.script_path = script_path
         self.is_python = is_python
-        self.processing_files = set()
+        self.processing_files = OrderedDict()
         self.lock = Lock()
-        self.semaphore = Semaphore(MAX_CONCURRENT_PROCESSES)
+        self.pending_files = []
+        self.executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_PROCESSES,
+            thread_name_prefix="stanza-proc"
+        )
+
+    def wait_for_writer_release(self, file_path):
+        """Wait until no writer holds the file open, using a share-mode probe.
 
-    def wait_for_stable_file(self, file_path):
-        """Enhanced stability check with file age verification."""
-        last_size = -1
-        unchanged_count = 0
-        wait_interval = INITIAL_CHECK_INTERVAL
+        Returns None when the probe does not apply (no pywin32, or a network
+        path where writer locks are not reported reliably).
+        """
+        drive = os.path.splitdrive(file_path)[0]
+        if win32file is None or not drive or drive.startswith(("\\\\", "//")):
+            return None
+        if win32file.GetDriveType(drive + "\\") == win32file.DRIVE_REMOTE:
+            return None
+
+        interval = SHARE_PROBE_INTERVAL
         start_time = time.time()
-        file_creation_time = os.path.getctime(file_path)
+        while time.time() - start_time <= MAX_WAIT_TIME:
+            try:
+                # Denying write sharing fails while any writer still has the file open
+                handle = win32file.CreateFileW(
+                    file_path, win32file.GENERIC_READ, win32file.FILE_SHARE_READ,
+                    None, win32file.OPEN_EXISTING, 0, None
+                )
+            except pywintypes.error as e:
+                if e.winerror != winerror.ERROR_SHARING_VIOLATION:
+                    logging.warning(f"Share-mode probe failed for {file_path}: {e}")
+                    return None
+                time.sleep(interval)
+                interval = min(interval * 2, INITIAL_CHECK_INTERVAL)
+                continue
+            win32file.CloseHandle(handle)
+            return True
+
+        logging.error(f"Timeout waiting for {file_path} to stabilize")
+        return False
+
+    def wait_for_stable_file(self, file_path, detected_at=None):
+        """Stability check polling at times placed from past write durations.
+
+        The schedule is measured from detected_at (when the file was seen), so
+        time spent queued for a worker counts; the first unchanged poll is then
+        confirmed at CONFIRM_INTERVAL rather than at the next scheduled point.
+        """
+        released = self.wait_for_writer_release(file_path)
+        if released is False:
+            return False
+        # Writers that reopen the file between chunks can pass the probe mid-write,
+        # so a released file still needs one unchanged poll and MIN_FILE_AGE
+        confirmations = 1 if released else STABLE_CONFIRMATIONS
+
+        ext = os.path.splitext(file_path)[1].lower()
+        durations = [d for _, d in load_history().get(ext, [])]
+        schedule = compute_poll_schedule(durations)
+        unchanged_polls = 0
+        start_time = detected_at if detected_at is not None else time.time()
+        st = os.stat(file_path)
+        # Baseline, so the first scheduled poll can already find the file unchanged
+        last_state = (st.st_size, st.st_mtime)
+        file_creation_time = st.st_ctime
+        last_poll = time.time()
+        polls = iter(schedule)
+        target = 0.0
+
+        while True:
+            if unchanged_polls:
+                wake = last_poll + CONFIRM_INTERVAL
+            else:
+                # Skip points that passed while the file waited for a worker
+                while target <= last_poll - start_time:
+                    previous = target
+                    target = next(polls, None)
+                    if target is None:
+                        # Schedule exhausted, keep polling at the capped interval
+                        target = previous + STABILITY_THRESHOLD
+                wake = max(start_time + target, last_poll + INITIAL_CHECK_INTERVAL)
+            time.sleep(max(0.0, wake - time.time()))
+            last_poll = time.time()
 
-        while unchanged_count < STABILITY_THRESHOLD:
             try:
-                # Check if file is old enough to process
-                if time.time() - file_creation_time < MIN_FILE_AGE:
-                    logging.debug(f"File too new, waiting: {file_path}")
-                    unchanged_count = 0
-                    time.sleep(wait_interval)
-                    continue
-
-                current_size = os.path.getsize(file_path)
-                if current_size == last_size:
-                    unchanged_count += 1
-                    wait_interval = min(wait_interval * 1.5, STABILITY_THRESHOLD)
-                else:
-                    unchanged_count = 0
-                    wait_interval = INITIAL_CHECK_INTERVAL
-                last_size = current_size
+                st = os.stat(file_path)
+                # Size and mtime from the same stat call
+                current_state = (st.st_size, st.st_mtime)
             except OSError as e:
                 logging.warning(f"Error accessing {file_path}: {e}")
-                unchanged_count = 0
-            
+                current_state = None
+
+            if current_state is None or current_state != last_state:
+                last_state = current_state
+                unchanged_polls = 0
+            elif time.time() - file_creation_time < MIN_FILE_AGE:
+                logging.debug(f"File too new, waiting: {file_path}")
+            else:
+                unchanged_polls += 1
+                if unchanged_polls >= confirmations:
+                    # Time from detection to the last write, as the schedule measures it
+                    record_write_duration(file_path, st.st_size, max(0.0, st.st_mtime - start_time))
+                    return True
+
             if time.time() - start_time > MAX_WAIT_TIME:
                 logging.error(f"Timeout waiting for {file_path} to stabilize")
                 return False
-            
-            time.sleep(wait_interval)
-        
-        return True
 
-    def run_script(self, file_path):
+    def run_script(self, file_paths):
         """Execute the script with enhanced error handling."""
-        try:
-            with self.semaphore:
-                logging.info(f"Starting processing: {file_path}")
-                
-                cmd = ["python", self.script_path, file_path] if self.is_python else [
-                    "powershell", "-File", self.script_path, file_path]
-                
+        if self.is_python:
+            # One interpreter handles the whole batch, one file after another
+            commands = [(["python", self.script_path, *file_paths], file_paths)]
+        else:
+            commands = [(["powershell", "-File", self.script_path, file_path], [file_path])
+                        for file_path in file_paths]
+
+        for cmd, files in commands:
+            label = ", ".join(files)
+            try:
+                logging.info(f"Starting processing: {label}")
+
                 result = subprocess.run(
                     cmd,
                     check=True,
-                    timeout=3600,
+                    timeout=SCRIPT_TIMEOUT * len(files),
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE,
                     text=True
                 )
-                
-                logging.info(f"Completed processing: {file_path}")
+
+                logging.info(f"Completed processing: {label}")
                 if result.stdout:
                     logging.debug(f"Script output: {result.stdout}")
-        
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Script failed for {file_path}. Error: {e.stderr}")
-        except subprocess.TimeoutExpired:
-            logging.error(f"Script timeout for {file_path}")
+
+            except subprocess.CalledProcessError as e:
+                logging.error(f"Script failed for {label}. Error: {e.stderr}")
+            except subprocess.TimeoutExpired:
+                logging.error(f"Script timeout for {label}")
+            except Exception as e:
+                logging.error(f"Unexpected error processing {label}: {str(e)}")
+
+    def run_and_release(self, file_paths):
+        """Run the script on the files, then let them be picked up again."""
+        try:
+            self.run_script(file_paths)
+        finally:
+            for file_path in file_paths:
+                self.processing_files.pop(file_path, None)
+
+    def run_batched(self, file_path):
+        """Queue a stable file; the first file of a batch runs it after BATCH_WINDOW.
+
+        Each file takes minutes, so the batch is dealt round-robin into up to
+        MAX_CONCURRENT_PROCESSES interpreters: files only share a run when they
+        would otherwise have waited for a free worker.
+        """
+        with self.lock:
+            self.pending_files.append(file_path)
+            if len(self.pending_files) > 1:
+                return
+        time.sleep(BATCH_WINDOW)
+        with self.lock:
+            batch, self.pending_files = self.pending_files, []
+        runs = [batch[i::MAX_CONCURRENT_PROCESSES] for i in range(min(len(batch), MAX_CONCURRENT_PROCESSES))]
+        for run in runs[1:]:
+            self.executor.submit(self.run_and_release, run)
+        self.run_and_release(runs[0])
+
+    def _process(self, file_path, detected_at):
+        """Wait for the file to settle, then hand it to the next script batch."""
+        try:
+            if self.wait_for_stable_file(file_path, detected_at):
+                if self.is_python:
+                    self.run_batched(file_path)
+                else:
+                    # PowerShell runs one file per process, so batching saves nothing
+                    self.run_and_release([file_path])
+                return
+            logging.warning(f"Failed to stabilize: {file_path}")
         except Exception as e:
             logging.error(f"Unexpected error processing {file_path}: {str(e)}")
-        finally:
-            with self.lock:
-                self.processing_files.discard(file_path)
+        self.processing_files.pop(file_path, None)
 
     def on_created(self, event):
         if event.is_directory:
             return
 
         file_path = event.src_path
+        name = os.path.basename(file_path).lower()
+        if name.startswith(IGNORE_PREFIXES) or name.endswith(IGNORE_SUFFIXES):
+            logging.debug(f"Ignoring temporary file: {file_path}")
+            return
         logging.info(f"Detected new file: {file_path}")
 
-        with self.lock:
-            if file_path in self.processing_files:
-                logging.info(f"Already processing {file_path}, skipping")
-                return
-            self.processing_files.add(file_path)
-
-        def process():
-            if self.wait_for_stable_file(file_path):
-                self.run_script(file_path)
-            else:
-                logging.warning(f"Failed to stabilize: {file_path}")
-                with self.lock:
-                    self.processing_files.discard(file_path)
+        # setdefault is atomic under the GIL, so no lock is needed on the event thread;
+        # getting a different token back means another event already claimed the file
+        token = object()
+        if self.processing_files.setdefault(file_path, token) is not token:
+            logging.info(f"Already processing {file_path}, skipping")
+            return
+        if len(self.processing_files) > MAX_TRACKED_FILES:
+            self.processing_files.popitem(last=False)
 
-        Thread(target=process, daemon=True).start()
+        self.executor.submit(self._process, file_path, time.time())
 
 def start_folder_watch(folder_mapping):
-    observer = Observer()
+    observer = NativeObserver()
+    handlers = []
     for folder, (script_path, is_python) in folder_mapping.items():
         if not os.path.exists(script_path):
             logging.error(f"Script not found: {script_path}")
             continue
         handler = RobustFolderWatchHandler(script_path, is_python)
+        handlers.append(handler)
         observer.schedule(handler, folder, recursive=True)
         logging.info(f"Watching folder: {folder} (recursive)")
     
     observer.start()
     logging.info("Folder watch service started")
     
+    # Block until a stop signal arrives instead of waking up every second
+    stop_event = Event()
+
+    def request_stop(signum, frame):
+        stop_event.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM, getattr(signal, "SIGBREAK", None)):
+        if sig is not None:
+            signal.signal(sig, request_stop)
+
+    if win32api is not None:
+        # Console control handlers run on their own thread, so they wake the wait
+        # directly; Python signal handlers only run once the main thread resumes
+        def on_console_ctrl(ctrl_type):
+            if ctrl_type in (win32con.CTRL_C_EVENT, win32con.CTRL_BREAK_EVENT, win32con.CTRL_CLOSE_EVENT):
+                stop_event.set()
+                return True
+            return False
+
+        win32api.SetConsoleCtrlHandler(on_console_ctrl, True)
+
     try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
+        # A timed wait returns to the interpreter so signal handlers get to run
+        while not stop_event.wait(STOP_CHECK_INTERVAL):
+            pass
         logging.info("Shutting down folder watcher...")
     finally:
+        observer.stop()
         observer.join()
+        for handler in handlers:
+            handler.executor.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     folder_mapping = {
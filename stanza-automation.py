@@ -1,9 +1,22 @@
 import os
 import time
+import base64
+import tempfile
 import requests
 import json
+import logging
+from pathlib import PurePath
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 
+# The JWT cache is shared between runs under a file lock; without filelock every run logs in
+try:
+    from filelock import FileLock, Timeout
+except ImportError:
+    FileLock = None
+
 USERNAME = "postmams"
 PASSWORD = "gma7mams"
 MODE = "CEA_608"
@@ -14,6 +27,7 @@ BASE_URL = "http://localhost:7000/api"
 #SPEECH-TO-TEXT VARIABLES
 LANGUAGE = "tl"
 MODEL = "LargeV2"
+START_RETRY_DELAYS = (1, 2, 4, 8)  # Seconds to wait before each attempt to start the job
 TRANSCRIPTION_PROMPT = (
     "Transcribe only clearly spoken Tagalog, including English words with a Tagalog accent."
     "Ignore background noise, music, silence, and unclear speech."
@@ -26,6 +40,10 @@ EXPORT_FORMAT = "scc"
 FRAMERATE = "29.97"
 DROP_FRAME = "true"
 
+#STATUS-POLLING VARIABLES
+STATUS_POLL_MIN_INTERVAL = 2    # Shortest wait between status checks (seconds)
+STATUS_POLL_MAX_INTERVAL = 30   # Upper bound on the backoff between checks
+
 # API URLs (one-liners)
 JWT_URL = f"{BASE_URL}/users/jwt-login"
 PROJECT_URL = f"{BASE_URL}/projects/add-project"
@@ -48,63 +66,170 @@ LOCATION_ALIAS_MAPPING = {
     }
 }
 
+#JWT CACHE VARIABLES
+JWT_CACHE_FILE = os.path.join(tempfile.gettempdir(), "stanza_jwt.json")
+JWT_LOCK_FILE = os.path.join(tempfile.gettempdir(), "stanza_jwt.lock")
+JWT_REFRESH_MARGIN = 60  # Seconds of validity a cached token must have left
+
+# Pre-encoded request bodies (static parts are serialized once at import)
+ASSIGNEE_ID = "edce626a-e85d-4faa-b96c-c55198e70c7e"  # Hardcoded assignee ID
+STATUS_ID = "804d5879-e2c2-45be-95da-6e0f89c4bb38"
+JWT_BODY = json.dumps({"userName": USERNAME, "password": PASSWORD}).encode()
+PROJECT_BODY_TMPL = '{"projectName": %s, "videoFile": %s, ' + json.dumps({
+    "subtitleFile": "",
+    "dueDateTime": "",
+    "configuration": {
+        "mode": MODE,
+        "maxLineCount": 2,
+        "maxLineLength": 28,
+        "minDuration": 0,
+        "maxDuration": 0,
+        "maxCPS": 0
+    },
+    "language": "fil-PH"
+})[1:]
+ASSIGNEE_BODY_TMPL = '{"projectId": %s, "newAssigneeId": ' + json.dumps(ASSIGNEE_ID) + '}'
+STATUS_BODY_TMPL = '{"projectId": %s, "newStatusId": ' + json.dumps(STATUS_ID) + '}'
+
+# Shared HTTP session (keep-alive connection to the local API)
+REQUEST_TIMEOUT = (3.0, 120.0)  # (connect, read) seconds, so a stalled API cannot hang a worker
+STATUS_TIMEOUT = (3.0, 60.0)
+SESSION = requests.Session()
+SESSION.headers.update({"Accept-Encoding": "identity", "Connection": "keep-alive"})
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
 # Global Variables
 jwt_token = None
 LOCATION_ALIAS = None
 
 
-def print_curl_command(method, url, headers, data=None):
-    """Prints a cURL command for debugging purposes."""
+def _curl_debug(method, url, headers, data=None):
+    """Logs a cURL command for debugging purposes when DEBUG logging is enabled."""
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
     command = f"curl -X {method} '{url}'"
     for header, value in headers.items():
         command += f" -H '{header}: {value}'"
     if data:
-        command += f" -d '{json.dumps(data)}'"
-    print("cURL Command:", command)
+        command += f" -d '{data.decode()}'"
+    logging.debug("cURL Command: %s", command)
 
 
-def get_jwt_token():
-    """Authenticates and retrieves the JWT token."""
-    global jwt_token
-    payload = {"userName": USERNAME, "password": PASSWORD}
+def _jwt_expiry(token):
+    """Returns the exp claim of a JWT, or 0 if it cannot be read."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return 0
+
+
+def _read_cached_jwt_token():
+    """Returns the cached JWT token if it is still valid for a while."""
+    try:
+        with open(JWT_CACHE_FILE) as f:
+            cached = json.load(f)
+        if cached["exp"] - time.time() > JWT_REFRESH_MARGIN:
+            return cached["token"]
+    except (OSError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+def _discard_cached_jwt_token():
+    """Removes the cached JWT token so no run reuses it."""
+    try:
+        os.remove(JWT_CACHE_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Warning: Failed to remove cached JWT token. {str(e)}")
+
+
+def _request_jwt_token():
+    """Logs in and returns a fresh JWT token, caching it for other runs."""
     headers = {'Accept': 'text/plain', 'Content-Type': 'application/json-patch+json'}
     
-    print_curl_command("POST", JWT_URL, headers, payload)
+    _curl_debug("POST", JWT_URL, headers, JWT_BODY)
     
     try:
-        response = requests.post(JWT_URL, json=payload, headers=headers)
+        response = SESSION.post(JWT_URL, data=JWT_BODY, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        jwt_token = response.json()['token']
+        token = response.json()['token']
     except requests.exceptions.RequestException as e:
         print(f"Error: Failed to get JWT token. {str(e)}")
-        jwt_token = None
+        return None
+    
+    if FileLock is None:
+        return token
+    try:
+        with open(JWT_CACHE_FILE, "w") as f:
+            json.dump({"token": token, "exp": _jwt_expiry(token)}, f)
+    except OSError as e:
+        print(f"Warning: Failed to cache JWT token. {str(e)}")
+    return token
+
+
+def get_jwt_token(refresh=False):
+    """Retrieves the JWT token, reusing the cached one while it is valid.
+
+    With refresh=True the cached token is discarded and a new one requested.
+    """
+    global jwt_token
+    if FileLock is None:
+        jwt_token = _request_jwt_token()
+    else:
+        try:
+            # Concurrent runs share one login instead of each hitting /jwt-login
+            with FileLock(JWT_LOCK_FILE, timeout=5):
+                if refresh:
+                    _discard_cached_jwt_token()
+                jwt_token = _read_cached_jwt_token() or _request_jwt_token()
+        except Timeout:
+            jwt_token = _request_jwt_token()
+    
+    if jwt_token:
+        SESSION.headers["Authorization"] = f"Bearer {jwt_token}"
+
+
+def _retry_with_fresh_jwt(response, *args, **kwargs):
+    """Response hook: on a 401 with a cached token, log in again and resend once."""
+    request = response.request
+    if response.status_code != 401 or request.url == JWT_URL or getattr(request, "jwt_retried", False):
+        return response
+    print("JWT token rejected, logging in again.")
+    get_jwt_token(refresh=True)
+    if not jwt_token:
+        return response
+    retry = request.copy()
+    retry.headers["Authorization"] = f"Bearer {jwt_token}"
+    retry.jwt_retried = True
+    response.close()
+    return SESSION.send(retry, **kwargs)
+
+
+SESSION.hooks["response"].append(_retry_with_fresh_jwt)
 
 
 def create_project(file):
     """Creates a new project using the provided file."""
-    file_name_without_extension = os.path.splitext(os.path.basename(file))[0]
-    filename_with_extension = os.path.basename(file)
-    project_data = {
-        "projectName": f"AI-{file_name_without_extension}-{PROCESS_DATE}",
-        "videoFile": f"::{LOCATION_ALIAS}\\AUTOMATION\\SOURCE\\{filename_with_extension}",
-        "subtitleFile": "",
-        "dueDateTime": "",
-        "configuration": {
-            "mode": MODE,
-            "maxLineCount": 2,
-            "maxLineLength": 28,
-            "minDuration": 0,
-            "maxDuration": 0,
-            "maxCPS": 0
-        },
-        "language": "fil-PH"
-    }
-    headers = {"Authorization": f"Bearer {jwt_token}", "Accept": "text/plain"}
+    path = PurePath(file)
+    file_name_without_extension, filename_with_extension = path.stem, path.name
+    project_body = (PROJECT_BODY_TMPL % (
+        json.dumps(f"AI-{file_name_without_extension}-{PROCESS_DATE}"),
+        json.dumps(f"::{LOCATION_ALIAS}\\AUTOMATION\\SOURCE\\{filename_with_extension}")
+    )).encode()
+    headers = {"Accept": "text/plain", "Content-Type": "application/json"}
     
-    print_curl_command("POST", PROJECT_URL, headers, project_data)
+    _curl_debug("POST", PROJECT_URL, headers, project_body)
     
     try:
-        response = requests.post(PROJECT_URL, json=project_data, headers=headers)
+        response = SESSION.post(PROJECT_URL, data=project_body, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         project_info = response.json()
         return project_info['id'], project_info['programs'][0]['id']
@@ -115,16 +240,13 @@ def create_project(file):
 
 def set_project_assignee(project_id):
     """Sets the assignee for a project."""
-    assignee_data = {
-        "projectId": project_id,
-        "newAssigneeId": "edce626a-e85d-4faa-b96c-c55198e70c7e"  # Hardcoded assignee ID
-    }
-    headers = {"Authorization": f"Bearer {jwt_token}", "Content-Type": "application/json"}
+    assignee_body = (ASSIGNEE_BODY_TMPL % json.dumps(project_id)).encode()
+    headers = {"Content-Type": "application/json"}
     
-    print_curl_command("POST", SET_ASSIGNEE_URL.format(project_id), headers, assignee_data)
+    _curl_debug("POST", SET_ASSIGNEE_URL.format(project_id), headers, assignee_body)
     
     try:
-        response = requests.post(SET_ASSIGNEE_URL.format(project_id), json=assignee_data, headers=headers)
+        response = SESSION.post(SET_ASSIGNEE_URL.format(project_id), data=assignee_body, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         print(f"Assignee set successfully for project {project_id}.")
         return True
@@ -135,16 +257,13 @@ def set_project_assignee(project_id):
 
 def set_project_status(project_id):
     """Sets the status for a project."""
-    status_data = {
-        "projectId": project_id,
-        "newStatusId": "804d5879-e2c2-45be-95da-6e0f89c4bb38"
-    }
-    headers = {"Authorization": f"Bearer {jwt_token}", "Accept": "application/json"}
+    status_body = (STATUS_BODY_TMPL % json.dumps(project_id)).encode()
+    headers = {"Accept": "application/json", "Content-Type": "application/json"}
     
-    print_curl_command("POST", SET_STATUS_URL.format(project_id), headers, status_data)
+    _curl_debug("POST", SET_STATUS_URL.format(project_id), headers, status_body)
     
     try:
-        response = requests.post(SET_STATUS_URL.format(project_id), json=status_data, headers=headers)
+        response = SESSION.post(SET_STATUS_URL.format(project_id), data=status_body, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
@@ -154,27 +273,35 @@ def set_project_status(project_id):
 
 def process_speech_to_text(project_id, program_id):
     """Initiates the speech-to-text process for a project."""
-    headers = {"Authorization": f"Bearer {jwt_token}", "Accept": "text/plain"}
-    time.sleep(10)  # Wait before starting the process
+    headers = {"Accept": "text/plain"}
     
-    print_curl_command("POST", SPEECH_TO_TEXT_URL.format(project_id, program_id), headers)
+    _curl_debug("POST", SPEECH_TO_TEXT_URL.format(project_id, program_id), headers)
     
-    try:
-        response = requests.post(SPEECH_TO_TEXT_URL.format(project_id, program_id), headers=headers)
-        response.raise_for_status()
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Error: Failed to start speech-to-text for project {project_id}. {str(e)}")
-        return False
+    # The new project may not accept the request yet; retry client errors with backoff
+    for attempt, delay in enumerate(START_RETRY_DELAYS, 1):
+        time.sleep(delay)
+        try:
+            response = SESSION.post(SPEECH_TO_TEXT_URL.format(project_id, program_id), headers=headers, timeout=REQUEST_TIMEOUT)
+            if 400 <= response.status_code < 500 and attempt < len(START_RETRY_DELAYS):
+                print(f"Project {project_id} not ready for speech-to-text (HTTP {response.status_code}), retrying.")
+                continue
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"Error: Failed to start speech-to-text for project {project_id}. {str(e)}")
+            return False
 
 
 def check_speech_to_text_status(project_id):
     """Checks the status of the speech-to-text process."""
-    headers = {"Authorization": f"Bearer {jwt_token}", "Accept": "application/json"}
+    headers = {"Accept": "application/json"}
+    interval = STATUS_POLL_MIN_INTERVAL
+    last_progress = None
+    last_check = time.monotonic()
     
     while True:
         try:
-            response = requests.get(OPERATIONS_URL, headers=headers)
+            response = SESSION.get(OPERATIONS_URL, headers=headers, timeout=STATUS_TIMEOUT)
             response.raise_for_status()
             operations = response.json()
             
@@ -183,21 +310,31 @@ def check_speech_to_text_status(project_id):
                     progress = operation.get('progress', 0)
                     if progress == 100:
                         return True
-                    else:
-                        time.sleep(10)  # Wait before checking again
+                    now = time.monotonic()
+                    if last_progress is not None and progress > last_progress:
+                        # Job is moving, aim the next check at the projected finish
+                        rate = (progress - last_progress) / (now - last_check)
+                        interval = (100 - progress) / rate
+                    if last_progress is None or progress > last_progress:
+                        last_progress, last_check = progress, now
+                    break
         except requests.exceptions.RequestException as e:
             print(f"Error: Failed to check speech-to-text status for project {project_id}. {str(e)}")
             return False
+        
+        interval = min(max(interval, STATUS_POLL_MIN_INTERVAL), STATUS_POLL_MAX_INTERVAL)
+        time.sleep(interval)  # Wait before checking again
+        interval *= 1.5
 
 
 def export_caption(project_id, program_id, exportLocation_id):
     """Exports the caption file for a project."""
-    headers = {"Authorization": f"Bearer {jwt_token}", "Accept": "text/plain"}
+    headers = {"Accept": "text/plain"}
     
-    print_curl_command("POST", EXPORT_CAPTION_URL.format(project_id, program_id, exportLocation_id), headers)
+    _curl_debug("POST", EXPORT_CAPTION_URL.format(project_id, program_id, exportLocation_id), headers)
     
     try:
-        response = requests.post(EXPORT_CAPTION_URL.format(project_id, program_id, exportLocation_id), headers=headers)
+        response = SESSION.post(EXPORT_CAPTION_URL.format(project_id, program_id, exportLocation_id), headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
@@ -210,11 +347,9 @@ def main(file):
     global LOCATION_ALIAS
     
     # Determine LOCATION_ALIAS and exportLocation_id based on file path
-    location_key = None
-    for key in LOCATION_ALIAS_MAPPING:
-        if key in file.lower():
-            location_key = key
-            break
+    # (split on both separators so drive and UNC share paths match alike)
+    path_parts = file.lower().replace("\\", "/").split("/")
+    location_key = next((part for part in path_parts if part in LOCATION_ALIAS_MAPPING), None)
     
     if not location_key:
         print("Error: File path must contain either 'pmc_stanza_tst' or 'stanza_transit'.")
@@ -236,11 +371,12 @@ def main(file):
     if not project_id or not program_id:
         return
     
-    if not set_project_status(project_id):
-        return
-    
-    if not set_project_assignee(project_id):
-        return
+    # Status and assignee are independent once the project exists
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        status_set = executor.submit(set_project_status, project_id)
+        assignee_set = executor.submit(set_project_assignee, project_id)
+        if not status_set.result() or not assignee_set.result():
+            return
     
     if not process_speech_to_text(project_id, program_id):
         return
@@ -256,8 +392,17 @@ def main(file):
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1:
-        file = sys.argv[1]
-        main(file)
+    # --debug (or STANZA_LOG_LEVEL=DEBUG) turns on the cURL command logging
+    args = [arg for arg in sys.argv[1:] if arg != "--debug"]
+    debug = len(args) < len(sys.argv) - 1
+    log_level = "DEBUG" if debug else os.environ.get("STANZA_LOG_LEVEL", "WARNING")
+    logging.basicConfig(level=log_level.upper(), format="%(asctime)s - %(levelname)s - %(message)s")
+    if args:
+        for file in args:
+            # One bad file must not stop the rest of the batch
+            try:
+                main(file)
+            except Exception as e:
+                print(f"Error: Unexpected failure processing {file}. {str(e)}")
     else:
-        print("Usage: stanza-automation.py <filepath>")
\ No newline at end of file
+        print("Usage: stanza-automation.py [--debug] <filepath> [<filepath> ...]")
\ No newline at end of file
@@ -1,20 +1,27 @@
 #!/usr/bin/env python3
 import os
 import zipfile
-import io
 
-# Create a zip file in memory
-zip_buffer = io.BytesIO()
-with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+# Write the zip file straight to disk; the sources are small text files, so
+# the fastest deflate level loses almost nothing in size
+with zipfile.ZipFile('stanza_automation_enhanced.zip', 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
     
     # 1. app.py
     zipf.writestr('app.py', '''import os
+import json
+import time
+import shutil
+import secrets
+import threading
 import torch
 import numpy as np
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify
+from flask import Flask, Response, request, render_template, redirect, url_for, flash, jsonify, abort
 from flask_admin import Admin, AdminIndexView, expose
 from flask_admin.contrib.sqla import ModelView
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from sqlalchemy import insert
+from werkzeug.utils import secure_filename
+from sqlalchemy.orm import load_only
 import sqlite3
 from datetime import datetime
 import wave
@@ -24,8 +31,8 @@ import contextlib
 from config import Config
 from models.database import db
 from models.models import Configuration, AudioFile, User
-from utils.audio_processing import process_audio_with_vad, get_audio_duration
-from utils.vad_utils import load_vad_model
+from utils.audio_processing import get_audio_duration
+from utils.vad_worker import VadWorker
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -43,8 +50,32 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Load Silero VAD model
-vad_model, get_speech_timestamps = load_vad_model()
+# Silero VAD runs in a background process that batches requests
+vad_worker = VadWorker()
+
+# File ids with a VAD run in progress (row locks are a no-op on SQLite)
+processing_ids = set()
+processing_lock = threading.Lock()
+
+# Process-local cache of the configuration table
+_CFG_CACHE = {'t': 0.0, 'v': None, 'json': None}
+
+def load_config(ttl=30):
+    """Return configuration as a dict, re-reading the table at most every ttl seconds"""
+    now = time.monotonic()
+    if _CFG_CACHE['v'] is not None and now - _CFG_CACHE['t'] < ttl:
+        return _CFG_CACHE['v']
+    rows = db.session.execute(db.select(Configuration.name, Configuration.value)).all()
+    value = dict(rows)
+    # Encoded once per refresh so /api/config just returns the bytes
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':')).encode()
+    _CFG_CACHE.update(t=now, v=value, json=payload)
+    return value
+
+def load_config_json(ttl=30):
+    """Return configuration as pre-encoded JSON bytes"""
+    load_config(ttl)
+    return _CFG_CACHE['json']
 
 # Custom admin index view
 class MyAdminIndexView(AdminIndexView):
@@ -72,10 +103,51 @@ admin.add_view(SecureModelView(User, db.session))
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+def upload_filename(original_filename):
+    """Unique on-disk name for an upload, safe against path traversal"""
+    return f"{time.time_ns():x}_{secrets.token_hex(6)}_{secure_filename(original_filename)}"
+
+def save_upload(file, filepath):
+    """Stream an uploaded file to disk with a 1 MB copy buffer"""
+    with open(filepath, 'wb') as dst:
+        shutil.copyfileobj(file.stream, dst, length=1 << 20)
+
+def drop_page_cache(filepath):
+    """Tell the OS the freshly written upload need not stay in the page cache"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(filepath, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+def insert_ignore(model, rows, key):
+    """Insert rows, skipping those whose unique key column already has the value"""
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        db.session.execute(dialect_insert(model).values(rows).on_conflict_do_nothing(index_elements=[key]))
+        return
+
+    # Other backends: look up the existing keys, then insert the rest
+    column = getattr(model, key)
+    existing = set(db.session.scalars(db.select(column).where(column.in_([row[key] for row in rows]))))
+    missing = [row for row in rows if row[key] not in existing]
+    if missing:
+        db.session.execute(insert(model), missing)
+
 # Routes
 @app.route('/')
 def index():
-    audio_files = AudioFile.query.order_by(AudioFile.uploaded_at.desc()).limit(10).all()
+    # Only load the columns the listing renders
+    audio_files = AudioFile.query.options(load_only(
+        AudioFile.id, AudioFile.original_filename, AudioFile.duration,
+        AudioFile.uploaded_at, AudioFile.processed, AudioFile.segments
+    )).order_by(AudioFile.uploaded_at.desc()).limit(10).all()
     return render_template('index.html', audio_files=audio_files)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -118,20 +190,20 @@ def upload_file():
         
         if file:
             # Save the file
-            filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
+            filename = upload_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            save_upload(file, filepath)
             
             # Get duration
             duration = get_audio_duration(filepath)
+            drop_page_cache(filepath)
             
             # Save to database
-            audio_file = AudioFile(
+            db.session.execute(insert(AudioFile).values(
                 filename=filename,
                 original_filename=file.filename,
                 duration=duration
-            )
-            db.session.add(audio_file)
+            ))
             db.session.commit()
             
             flash(f'File successfully uploaded. Duration: {duration:.2f} seconds.')
@@ -142,16 +214,43 @@ def upload_file():
 @app.route('/process/<int:file_id>')
 @login_required
 def process_file(file_id):
-    audio_file = AudioFile.query.get_or_404(file_id)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], audio_file.filename)
+    # Only claim files that still need processing, skipping rows another request holds
+    audio_file = db.session.execute(
+        db.select(AudioFile)
+        .where(AudioFile.id == file_id, AudioFile.processed.is_(False))
+        .with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    if audio_file is None:
+        audio_file = AudioFile.query.get_or_404(file_id)
+        if audio_file.processed:
+            flash(f'File already processed ({audio_file.segments} segments).')
+        else:
+            flash('File is already being processed.')
+        return redirect(url_for('index'))
     
-    # Process with VAD
-    speech_segments = process_audio_with_vad(filepath, vad_model, get_speech_timestamps)
+    with processing_lock:
+        if file_id in processing_ids:
+            flash('File is already being processed.')
+            return redirect(url_for('index'))
+        processing_ids.add(file_id)
     
-    # Update database
-    audio_file.processed = True
-    audio_file.segments = len(speech_segments)
-    db.session.commit()
+    try:
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], audio_file.filename)
+        
+        # Process with VAD
+        batch_size = int(load_config().get('vad_batch_size', 16))
+        speech_segments = vad_worker.process_file(filepath, batch_size, timeout=app.config['VAD_TIMEOUT'])
+        if speech_segments is None:
+            abort(504)
+        
+        # Update database
+        audio_file.processed = True
+        audio_file.segments = len(speech_segments)
+        audio_file.processed_at = datetime.utcnow()
+        db.session.commit()
+    finally:
+        with processing_lock:
+            processing_ids.discard(file_id)
     
     # Here you would typically integrate with your existing Stanza automation
     # For now, we'll just return the segments found
@@ -162,8 +261,7 @@ def process_file(file_id):
 # API endpoints
 @app.route('/api/config')
 def get_config():
-    configs = Configuration.query.all()
-    return {config.name: config.value for config in configs}
+    return Response(load_config_json(), mimetype='application/json')
 
 @app.route('/api/upload', methods=['POST'])
 def api_upload():
@@ -174,23 +272,24 @@ def api_upload():
     if file.filename == '':
         return {'error': 'No filename'}, 400
     
-    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
+    filename = upload_filename(file.filename)
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    save_upload(file, filepath)
     
     duration = get_audio_duration(filepath)
+    drop_page_cache(filepath)
     
-    audio_file = AudioFile(
+    result = db.session.execute(insert(AudioFile).values(
         filename=filename,
         original_filename=file.filename,
         duration=duration
-    )
-    db.session.add(audio_file)
+    ).returning(AudioFile.id))
+    audio_id = result.scalar_one()
     db.session.commit()
     
     return {
-        'id': audio_file.id,
-        'filename': audio_file.original_filename,
+        'id': audio_id,
+        'filename': file.filename,
         'duration': duration
     }
 
@@ -216,6 +315,7 @@ if __name__ == '__main__':
         # Add default configurations if they don't exist
         default_configs = [
             ('vad_threshold', '0.5', 'Voice activity detection threshold'),
+            ('vad_batch_size', '16', 'Number of audio streams evaluated per VAD model call'),
             ('min_speech_duration', '0.5', 'Minimum speech duration in seconds'),
             ('max_speech_duration', '10.0', 'Maximum speech duration in seconds'),
             ('sample_rate', '16000', 'Audio sample rate'),
@@ -223,12 +323,17 @@ if __name__ == '__main__':
             ('output_format', 'text', 'Output format (text/json)'),
         ]
         
-        for name, value, description in default_configs:
-            if not Configuration.query.filter_by(name=name).first():
-                config = Configuration(name=name, value=value, description=description)
-                db.session.add(config)
+        rows = [
+            {'name': name, 'value': value, 'description': description}
+            for name, value, description in default_configs
+        ]
+        insert_ignore(Configuration, rows, 'name')
         
         db.session.commit()
+        
+        # Warm the compiled SQL cache before the first request
+        AudioFile.query.options(load_only(AudioFile.id)).limit(1).all()
+        Configuration.query.limit(1).all()
     
     app.run(debug=True, port=5000)
 ''')
@@ -244,8 +349,10 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \\
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {'query_cache_size': 1200, 'pool_pre_ping': True, 'future': True}
     UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    VAD_TIMEOUT = 600  # seconds to wait for the VAD worker
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME') or 'admin'
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') or 'admin'
     REMEMBER_COOKIE_DURATION = timedelta(days=7)
@@ -255,11 +362,13 @@ class Config:
     zipf.writestr('requirements.txt', '''flask==2.3.3
 flask-admin==1.6.1
 flask-sqlalchemy==3.0.5
+sqlalchemy>=2.0
 flask-login==0.6.2
 silero-vad==1.0.0
 torch>=1.9.0
 torchaudio>=0.9.0
-scipy>=1.7.3
+onnxruntime>=1.16.1
+soundfile>=0.12.1
 numpy>=1.21.0
 wave>=0.0.2
 python-dotenv>=0.19.0
@@ -278,13 +387,18 @@ if __name__ == '__main__':
 
 db = SQLAlchemy()
 ''')
-    zipf.writestr('models/models.py', '''from datetime import datetime
+    zipf.writestr('models/models.py', '''import os
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
 from .database import db
 
+# Optional override of werkzeug's password hash method (e.g. a cheaper PBKDF2
+# work factor for development); existing hashes keep verifying either way
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD')
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -293,7 +407,10 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        if PASSWORD_HASH_METHOD:
+            self.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+        else:
+            self.password_hash = generate_password_hash(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -321,6 +438,9 @@ class AudioFile(db.Model):
     processed = db.Column(db.Boolean, default=False)
     processed_at = db.Column(db.DateTime)
 
+    # Lets the recent-uploads listing read the newest rows off the index
+    __table_args__ = (db.Index('ix_audiofile_uploaded_at_desc', uploaded_at.desc()),)
+
     def __repr__(self):
         return f'<AudioFile {self.original_filename}>'
 ''')
@@ -329,12 +449,63 @@ class AudioFile(db.Model):
     zipf.writestr('utils/__init__.py', '')
     zipf.writestr('utils/audio_processing.py', '''import os
 import wave
+import struct
 import contextlib
 import numpy as np
-import scipy.io.wavfile as wav
+import soundfile as sf
+import torch
+
+# Compiled merge pass for long files with many candidate segments; optional
+try:
+    from utils.vad_numba import merge_and_filter
+except ImportError:
+    merge_and_filter = None
+
+# Each VAD stream starts from zeroed model state, so only split audio into
+# streams at least this many windows long (~2 s at 16 kHz)
+MIN_STREAM_WINDOWS = 64
+# Audios share a model loop only if the longest needs at most this many times the
+# steps of the shortest; everything in a loop is padded to the longest
+MAX_STEP_PADDING = 1.25
+
+def read_wav_header(filepath):
+    """Read the RIFF header of a WAV file.
+
+    Returns (channels, sample_rate, byte_rate, bits_per_sample, data_offset, data_size).
+    """
+    fd = os.open(filepath, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        hdr = os.read(fd, 44)
+        if len(hdr) < 36 or hdr[:4] != b'RIFF' or hdr[8:12] != b'WAVE' or hdr[12:16] != b'fmt ':
+            raise ValueError('Not a canonical WAV file')
+        channels, sample_rate, byte_rate = struct.unpack_from('<HII', hdr, 22)
+        bits = struct.unpack_from('<H', hdr, 34)[0]
+
+        # Canonical 44-byte header: the data chunk follows fmt directly
+        if hdr[36:40] == b'data':
+            return channels, sample_rate, byte_rate, bits, 44, struct.unpack_from('<I', hdr, 40)[0]
+
+        # Otherwise walk the chunk list until the data chunk
+        offset = 20 + struct.unpack_from('<I', hdr, 16)[0]
+        while True:
+            os.lseek(fd, offset, os.SEEK_SET)
+            chunk = os.read(fd, 8)
+            if len(chunk) < 8:
+                raise ValueError('No data chunk found')
+            chunk_id, chunk_size = chunk[:4], struct.unpack_from('<I', chunk, 4)[0]
+            if chunk_id == b'data':
+                return channels, sample_rate, byte_rate, bits, offset + 8, chunk_size
+            offset += 8 + chunk_size + (chunk_size & 1)
+    finally:
+        os.close(fd)
 
 def get_audio_duration(filepath):
     """Get duration of audio file in seconds"""
+    try:
+        _, _, byte_rate, _, _, data_size = read_wav_header(filepath)
+        return data_size / byte_rate
+    except Exception:
+        pass
     try:
         with contextlib.closing(wave.open(filepath, 'r')) as f:
             frames = f.getnframes()
@@ -343,37 +514,381 @@ def get_audio_duration(filepath):
     except:
         return 0
 
-def process_audio_with_vad(audio_path, vad_model, get_speech_timestamps):
-    """Process audio file with Silero VAD"""
-    try:
-        # Load audio file
-        sample_rate, audio_data = wav.read(audio_path)
-        
-        # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = audio_data.mean(axis=1)
-        
-        # Convert to float32
-        audio_data = audio_data.astype(np.float32) / 32768.0
-        
-        # Get speech timestamps
-        speech_timestamps = get_speech_timestamps(audio_data, vad_model, sampling_rate=sample_rate)
-        
-        return speech_timestamps
-    except Exception as e:
-        print(f"Error processing audio: {e}")
+def _merge_and_filter(starts, ends, silence_ends, min_silence_samples, min_speech_samples):
+    """Merge segments separated by short silences, then drop short segments
+
+    silence_ends[i] is the start of the last silent window after segment i.
+    """
+    keep_gap = silence_ends[:-1] - ends[:-1] >= min_silence_samples
+    starts = starts[np.concatenate(([True], keep_gap))]
+    ends = ends[np.concatenate((keep_gap, [True]))]
+    long_enough = ends - starts > min_speech_samples
+    return starts[long_enough], ends[long_enough]
+
+def _segments_from_probs(probs, audio_length, window, sampling_rate, threshold=0.5,
+                         min_speech_duration_ms=250, min_silence_duration_ms=100, speech_pad_ms=30):
+    """Turn per-window speech probabilities into {'start', 'end'} segments in seconds
+
+    Follows get_speech_timestamps: speech starts at threshold, ends after
+    min_silence below threshold - 0.15, and is padded by speech_pad_ms.
+    """
+    min_speech_samples = sampling_rate * min_speech_duration_ms / 1000
+    min_silence_samples = sampling_rate * min_silence_duration_ms / 1000
+    speech_pad_samples = int(sampling_rate * speech_pad_ms / 1000)
+    neg_threshold = max(threshold - 0.15, 0.01)
+
+    # Hysteresis: carry the last decisive window forward over the in-between ones
+    probs = np.asarray(probs)
+    n = len(probs)
+    positions = np.arange(n)
+    silent = probs < neg_threshold
+    decisive = (probs >= threshold) | silent
+    last = np.maximum.accumulate(np.where(decisive, positions, -1))
+    speech = (last >= 0) & (probs[np.maximum(last, 0)] >= threshold)
+
+    edges = np.diff(speech.view(np.int8), prepend=0, append=0)
+    start_idx = np.flatnonzero(edges == 1)
+    if not len(start_idx):
         return []
+    starts = start_idx * window
+    ends = np.minimum(np.flatnonzero(edges == -1) * window, audio_length)
+
+    # Silence only counts up to the last window below neg_threshold in each gap
+    last_silent = np.maximum.accumulate(np.where(silent, positions, -1))
+    silence_ends = last_silent[np.append(start_idx[1:], n) - 1] * window
+
+    # Speech whose trailing silence is too short runs to the end of the audio
+    if silence_ends[-1] - ends[-1] < min_silence_samples:
+        ends[-1] = audio_length
+
+    merge = merge_and_filter or _merge_and_filter
+    starts, ends = merge(starts, ends, silence_ends, min_silence_samples, min_speech_samples)
+    if not len(starts):
+        return []
+
+    # Pad segments, splitting the gap when neighbours are closer than two pads
+    gaps = starts[1:] - ends[:-1]
+    shift = np.where(gaps < 2 * speech_pad_samples, gaps // 2, speech_pad_samples)
+    starts[1:] -= shift
+    ends[:-1] += shift
+    starts[0] = max(0, starts[0] - speech_pad_samples)
+    ends[-1] = min(audio_length, ends[-1] + speech_pad_samples)
+
+    return [
+        {'start': start / sampling_rate, 'end': end / sampling_rate}
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+
+def _vad_probs_streams(audios, n_windows, rows, file_steps, model, sampling_rate, window):
+    """Run one model loop over the streams of several audios, padded to the longest"""
+    steps = max(file_steps)
+    padded = np.zeros((sum(rows), steps * window), dtype=np.float32)
+    row = 0
+    for audio, n_rows, n_steps in zip(audios, rows, file_steps):
+        length = n_steps * window
+        for i in range(n_rows):
+            chunk = audio[i * length:(i + 1) * length]
+            padded[row + i, :len(chunk)] = chunk
+        row += n_rows
+    streams = torch.from_numpy(padded).view(sum(rows), steps, window)
+
+    probs = np.empty((sum(rows), steps), dtype=np.float32)
+    model.reset_states()
+    with torch.inference_mode():
+        for step in range(steps):
+            probs[:, step] = model(streams[:, step], sampling_rate).numpy().reshape(-1)
+
+    results = []
+    row = 0
+    for n, n_rows, n_steps in zip(n_windows, rows, file_steps):
+        results.append(probs[row:row + n_rows, :n_steps].reshape(-1)[:n])
+        row += n_rows
+    return results
+
+def _vad_probs_batched(audios, model, sampling_rate, batch_size):
+    """Speech probabilities per window for each audio, sharing model calls
+
+    Every audio is split into up to batch_size contiguous streams of equal
+    length, each at least MIN_STREAM_WINDOWS long, that are fed to the model
+    as parallel rows, so each row keeps its own recurrent state across calls.
+    The split depends only on the audio's own length, so results do not
+    change with whatever shares the batch. Audios share a model loop only
+    when their step counts are within MAX_STEP_PADDING of each other, which
+    bounds the work spent on padding.
+    """
+    window = 512 if sampling_rate == 16000 else 256
+    n_windows = [max(1, -(-len(audio) // window)) for audio in audios]
+    file_steps = [-(-n // min(batch_size, max(1, n // MIN_STREAM_WINDOWS))) for n in n_windows]
+    rows = [-(-n // n_steps) for n, n_steps in zip(n_windows, file_steps)]
+
+    groups = []
+    for i in sorted(range(len(audios)), key=file_steps.__getitem__):
+        if groups and file_steps[i] <= file_steps[groups[-1][0]] * MAX_STEP_PADDING:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+
+    results = [None] * len(audios)
+    for group in groups:
+        probs = _vad_probs_streams(
+            [audios[i] for i in group], [n_windows[i] for i in group], [rows[i] for i in group],
+            [file_steps[i] for i in group], model, sampling_rate, window)
+        for i, file_probs in zip(group, probs):
+            results[i] = file_probs
+    return results
+
+def _load_pcm16(audio_path):
+    """Map the samples of a PCM16 WAV and downmix them to mono float32
+
+    Returns None when the file is not plain 16-bit PCM. Only the frames VAD
+    keeps are touched, and the mapped pages stay out of the process heap.
+    """
+    try:
+        channels, sample_rate, byte_rate, bits, data_offset, data_size = read_wav_header(audio_path)
+    except (OSError, ValueError, struct.error):
+        return None
+    frame_size = 2 * channels
+    if bits != 16 or not channels or byte_rate != sample_rate * frame_size:
+        return None
+    # Streaming writers can leave data_size unset; trust the file length instead
+    data_size = min(data_size, os.path.getsize(audio_path) - data_offset)
+    n_frames = data_size // frame_size
+    if n_frames <= 0:
+        return None
+
+    frames = np.memmap(audio_path, dtype='<i2', mode='r', offset=data_offset, shape=(n_frames, channels))
+    # Silero VAD runs at 8 or 16 kHz; decimate multiples of 16 kHz like get_speech_timestamps does
+    if sample_rate > 16000 and sample_rate % 16000 == 0:
+        frames = frames[::sample_rate // 16000]
+        sample_rate = 16000
+
+    audio_data = np.empty(len(frames), dtype=np.float32)
+    if channels == 1:
+        np.multiply(frames[:, 0], np.float32(1 / 32768), out=audio_data)
+    else:
+        np.sum(frames, axis=1, dtype=np.float32, out=audio_data)
+        audio_data *= np.float32(1 / (32768 * channels))
+    return audio_data, sample_rate
+
+def load_audio_for_vad(audio_path):
+    """Load an audio file as mono float32 at a rate Silero VAD can use where possible"""
+    loaded = _load_pcm16(audio_path)
+    if loaded is not None:
+        return loaded
+
+    # Decoded by libsndfile straight to float32 in [-1, 1)
+    audio_data, sample_rate = sf.read(audio_path, dtype='float32', always_2d=False)
+    
+    # Convert to mono if stereo
+    if audio_data.ndim > 1:
+        audio_data = audio_data.mean(axis=1, dtype=np.float32)
+    
+    # Silero VAD runs at 8 or 16 kHz; decimate multiples of 16 kHz like get_speech_timestamps does
+    if sample_rate > 16000 and sample_rate % 16000 == 0:
+        audio_data = audio_data[::sample_rate // 16000]
+        sample_rate = 16000
+    return audio_data, sample_rate
+
+def process_audio_files_with_vad(audio_paths, vad_model, get_speech_timestamps, batch_size=16, raise_errors=False):
+    """Process several audio files with Silero VAD, batching files with the same sample rate
+
+    Files that fail are logged and get no segments, unless raise_errors is set.
+    """
+    results = [[] for _ in audio_paths]
+    by_rate = {}
+    for i, audio_path in enumerate(audio_paths):
+        try:
+            audio_data, sample_rate = load_audio_for_vad(audio_path)
+            if sample_rate in (8000, 16000):
+                by_rate.setdefault(sample_rate, []).append((i, audio_data))
+            else:
+                results[i] = get_speech_timestamps(
+                    audio_data, vad_model, sampling_rate=sample_rate, return_seconds=True)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error processing audio: {e}")
+    
+    for sample_rate, items in by_rate.items():
+        window = 512 if sample_rate == 16000 else 256
+        try:
+            probs = _vad_probs_batched([audio for _, audio in items], vad_model, sample_rate, batch_size)
+            for (i, audio), file_probs in zip(items, probs):
+                results[i] = _segments_from_probs(file_probs, len(audio), window, sample_rate)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error processing audio: {e}")
+    
+    return results
+
+def process_audio_with_vad(audio_path, vad_model, get_speech_timestamps, batch_size=16, raise_errors=False):
+    """Process audio file with Silero VAD"""
+    return process_audio_files_with_vad(
+        [audio_path], vad_model, get_speech_timestamps, batch_size, raise_errors)[0]
 ''')
-    zipf.writestr('utils/vad_utils.py', '''import torch
-from silero_vad import load_silero_vad
+    zipf.writestr('utils/vad_utils.py', '''import os
+from importlib import resources
+
+import torch
+from silero_vad import get_speech_timestamps, load_silero_vad
 
-def load_vad_model():
+# 'onnx' (default) or 'torch' to fall back to the JIT model
+VAD_BACKEND = os.environ.get('STANZA_VAD_BACKEND', 'onnx')
+
+def load_vad_model(num_threads=None):
     """Load Silero VAD model"""
-    torch.set_num_threads(1)
-    model, utils = load_silero_vad()
-    get_speech_timestamps = utils[0]
+    if VAD_BACKEND == 'torch':
+        torch.set_num_threads(1)
+        # The pip package returns just the model, unlike the torch.hub loader
+        return load_silero_vad(), get_speech_timestamps
+
+    import onnxruntime
+
+    # The stock ONNX wrapper pins onnxruntime to one thread; give it every core
+    sess_opts = onnxruntime.SessionOptions()
+    sess_opts.intra_op_num_threads = num_threads or os.cpu_count() or 1
+    sess_opts.inter_op_num_threads = 1
+    sess_opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    sess_opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    model = load_silero_vad(onnx=True)
+    model_path = resources.files('silero_vad.data').joinpath('silero_vad.onnx')
+    with resources.as_file(model_path) as path:
+        model.session = onnxruntime.InferenceSession(
+            str(path), providers=['CPUExecutionProvider'], sess_options=sess_opts)
     return model, get_speech_timestamps
 ''')
+    zipf.writestr('utils/vad_worker.py', '''import itertools
+import multiprocessing
+import queue
+import threading
+import time
+
+MAX_BATCH = 16          # Most files run through the model together
+BATCH_WINDOW = 0.050    # Seconds to wait for more files before running a batch
+LIVENESS_CHECK = 1.0    # Seconds between checks that the worker process is still running
+
+def _worker_loop(in_q, out_q, max_batch, batch_window):
+    """Own the VAD model and answer jobs from in_q in micro-batches"""
+    from .audio_processing import process_audio_files_with_vad
+    from .vad_utils import load_vad_model
+
+    vad_model, get_speech_timestamps = load_vad_model()
+    running = True
+    while running:
+        job = in_q.get()
+        if job is None:
+            break
+        batch = [job]
+        deadline = time.monotonic() + batch_window
+        while len(batch) < max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = in_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                running = False
+                break
+            batch.append(job)
+
+        batch_size = batch[0][2]
+        results = process_audio_files_with_vad(
+            [filepath for _, filepath, _ in batch], vad_model, get_speech_timestamps, batch_size)
+        for (job_id, _, _), segments in zip(batch, results):
+            out_q.put((job_id, segments))
+
+class VadWorker:
+    """Runs VAD in a background process that batches requests across callers"""
+
+    def __init__(self, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW):
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count()
+        self.pending = {}
+        self.process = None
+
+    def _start(self):
+        # Started on first use so importing the app never spawns a process
+        with self.lock:
+            if self.process is not None and self.process.is_alive():
+                return
+            self.in_q = multiprocessing.Queue()
+            self.out_q = multiprocessing.Queue()
+            self.process = multiprocessing.Process(
+                target=_worker_loop,
+                args=(self.in_q, self.out_q, self.max_batch, self.batch_window),
+                daemon=True,
+            )
+            self.process.start()
+            threading.Thread(target=self._collect, args=(self.out_q,), daemon=True).start()
+
+    def _collect(self, out_q):
+        while True:
+            job_id, segments = out_q.get()
+            with self.lock:
+                job = self.pending.get(job_id)
+            if job is not None:
+                job['segments'] = segments
+                job['done'].set()
+
+    def process_file(self, filepath, batch_size=16, timeout=None):
+        """Run VAD on a file and return its speech segments, or None on timeout
+
+        Also returns None as soon as the worker process dies, e.g. when the
+        model fails to load, instead of waiting out the timeout.
+        """
+        self._start()
+        process = self.process
+        job_id = next(self.job_ids)
+        job = {'done': threading.Event(), 'segments': None}
+        with self.lock:
+            self.pending[job_id] = job
+        try:
+            self.in_q.put((job_id, filepath, batch_size))
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not job['done'].is_set():
+                remaining = LIVENESS_CHECK if deadline is None else min(LIVENESS_CHECK, deadline - time.monotonic())
+                if remaining <= 0 or not process.is_alive():
+                    break
+                job['done'].wait(remaining)
+            return job['segments']
+        finally:
+            with self.lock:
+                self.pending.pop(job_id, None)
+''')
+    zipf.writestr('utils/vad_numba.py', '''import numpy as np
+from numba import njit
+
+@njit(cache=True)
+def merge_and_filter(starts, ends, silence_ends, min_silence_samples, min_speech_samples):
+    """Merge segments separated by short silences, then drop short segments
+
+    One forward pass over the candidates; silence_ends[i] is the start of the
+    last silent window after segment i.
+    """
+    out_starts = np.empty_like(starts)
+    out_ends = np.empty_like(ends)
+    k = 0
+    start = starts[0]
+    for i in range(1, len(starts)):
+        if silence_ends[i - 1] - ends[i - 1] < min_silence_samples:
+            continue
+        if ends[i - 1] - start > min_speech_samples:
+            out_starts[k] = start
+            out_ends[k] = ends[i - 1]
+            k += 1
+        start = starts[i]
+    if ends[-1] - start > min_speech_samples:
+        out_starts[k] = start
+        out_ends[k] = ends[-1]
+        k += 1
+    return out_starts[:k], out_ends[:k]
+''')
 
     # 7. Create templates directory and files
     zipf.writestr('templates/base.html', '''<!DOCTYPE html>
@@ -464,6 +979,7 @@ def load_vad_model():
     <a class="btn btn-primary btn-lg" href="{{ url_for('upload_file') }}" role="button">Upload Audio</a>
 </div>
 
+{% set is_authenticated = current_user.is_authenticated %}
 <h2>Recent Uploads</h2>
 {% if audio_files %}
 <table class="table table-striped table-hover">
@@ -490,7 +1006,7 @@ def load_vad_model():
                 {% endif %}
             </td>
             <td>
-                {% if not file.processed and current_user.is_authenticated %}
+                {% if not file.processed and is_authenticated %}
                     <a href="{{ url_for('process_file', file_id=file.id) }}" class="btn btn-sm btn-primary">Process</a>
                 {% else %}
                     <button class="btn btn-sm btn-secondary" disabled>View Results</button>
@@ -691,6 +1207,8 @@ document.addEventListener('DOMContentLoaded', function() {
     zipf.writestr('.env', '''SECRET_KEY=your-super-secret-key-here
 ADMIN_USERNAME=admin
 ADMIN_PASSWORD=change-this-password
+# Cheaper password hashing for local development; remove to use werkzeug's default
+PASSWORD_HASH_METHOD=pbkdf2:sha256:120000
 ''')
 
     # 10. Create README.md
@@ -720,6 +1238,14 @@ Enhanced version of the Stanza Automation system with Silero Voice Activity Dete
 3. Process files with Silero VAD
 4. Configure settings through the admin panel (/admin/)
 
+## Bulk Processing
+
+To run VAD over every unprocessed upload in parallel worker processes:
+
+```
+python scripts/bulk_process.py [max_workers]
+```
+
 ## Admin Access
 
 Default admin credentials:
@@ -728,6 +1254,10 @@ Default admin credentials:
 
 Change these in production by setting the ADMIN_USERNAME and ADMIN_PASSWORD environment variables.
 
+## VAD Backend
+
+Silero VAD runs on ONNX Runtime using all CPU cores. Set `STANZA_VAD_BACKEND=torch` to use the PyTorch JIT model instead.
+
 ## API Endpoints
 
 - GET /api/config - Get current configuration
@@ -738,11 +1268,86 @@ Change these in production by setting the ADMIN_USERNAME and ADMIN_PASSWORD envi
     zipf.writestr('uploads/.gitkeep', '')
     zipf.writestr('instance/.gitkeep', '')
 
-# Get the zip file data
-zip_data = zip_buffer.getvalue()
+    # 12. Create scripts directory and files
+    zipf.writestr('scripts/bulk_process.py', '''"""Run Silero VAD over every unprocessed upload using a pool of worker processes.
 
-# Save the zip file
-with open('stanza_automation_enhanced.zip', 'wb') as f:
-    f.write(zip_data)
+Usage: python scripts/bulk_process.py [max_workers]
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMMIT_EVERY = 50  # Results written per bulk UPDATE
+
+# Per-process VAD model, loaded on the first file a worker receives
+_vad = None
+
+def _worker(filepath, batch_size, num_threads):
+    global _vad
+    from utils.audio_processing import process_audio_with_vad
+    from utils.vad_utils import load_vad_model
+
+    if _vad is None:
+        _vad = load_vad_model(num_threads)
+    vad_model, get_speech_timestamps = _vad
+    # Raise on unreadable files so they stay unprocessed instead of saving 0 segments
+    return process_audio_with_vad(filepath, vad_model, get_speech_timestamps, batch_size, raise_errors=True)
+
+def _save(db, AudioFile, results):
+    from sqlalchemy import update
+
+    now = datetime.utcnow()
+    db.session.execute(update(AudioFile), [
+        {'id': file_id, 'processed': True, 'segments': len(segments), 'processed_at': now}
+        for file_id, segments in results
+    ])
+    db.session.commit()
+
+def main(max_workers=None):
+    from app import app, load_config
+    from models.database import db
+    from models.models import AudioFile
+
+    max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+    num_threads = max(1, (os.cpu_count() or 1) // max_workers)
+
+    with app.app_context():
+        batch_size = int(load_config().get('vad_batch_size', 16))
+        pending = AudioFile.query.filter_by(processed=False).all()
+        print(f"Processing {len(pending)} files with {max_workers} workers")
+
+        results = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    _worker,
+                    os.path.join(app.config['UPLOAD_FOLDER'], audio_file.filename),
+                    batch_size,
+                    num_threads,
+                ): audio_file.id
+                for audio_file in pending
+            }
+            for future in as_completed(futures):
+                file_id = futures[future]
+                try:
+                    segments = future.result()
+                except Exception as e:
+                    print(f"Error processing file {file_id}: {e}")
+                    continue
+                results.append((file_id, segments))
+                if len(results) >= COMMIT_EVERY:
+                    _save(db, AudioFile, results)
+                    results = []
+
+        if results:
+            _save(db, AudioFile, results)
+        print("Done")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+''')
 
 print("Zip file created: stanza_automation_enhanced.zip")
\ No newline at end of file
@@ -0,0 +1,97 @@
+import importlib.util
+import logging
+import math
+import os
+import random
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+WATCHDOG_SCRIPT = Path(__file__).resolve().parent.parent / "Stanza-WatchDog.py"
+
+
+@pytest.fixture(scope="module")
+def watchdog_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("watchdog")
+
+
+@pytest.fixture(scope="module")
+def watchdog_module(watchdog_dir):
+    # The script opens its log file in the working directory on import
+    cwd = os.getcwd()
+    os.chdir(watchdog_dir)
+    try:
+        spec = importlib.util.spec_from_file_location("stanza_watchdog", WATCHDOG_SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
+
+
+def assert_valid_schedule(module, schedule):
+    assert len(schedule) == module.POLL_BUDGET
+    assert all(math.isfinite(t) and t > 0 for t in schedule)
+    assert all(b - a >= module.INITIAL_CHECK_INTERVAL - 1e-9 for a, b in zip(schedule, schedule[1:]))
+
+
+@pytest.mark.parametrize("durations", [[], [4.2]])
+def test_short_history_uses_geometric_schedule(watchdog_module, durations):
+    schedule = watchdog_module.compute_poll_schedule(durations)
+    assert_valid_schedule(watchdog_module, schedule)
+    assert schedule[0] == watchdog_module.INITIAL_CHECK_INTERVAL
+
+
+@pytest.mark.parametrize("duration", [0.0, 3.53, 8.1, 13.2, 20.8, 600.0])
+def test_identical_durations(watchdog_module, duration):
+    assert_valid_schedule(watchdog_module, watchdog_module.compute_poll_schedule([duration] * 5))
+
+
+@pytest.mark.parametrize("duration", [3.5, 8.1, 13.2, 20.8])
+def test_clustered_durations_with_jitter(watchdog_module, duration):
+    rng = random.Random(duration)
+    for _ in range(24):
+        durations = [duration + rng.uniform(-0.05, 0.05) for _ in range(rng.randint(2, 50))]
+        assert_valid_schedule(watchdog_module, watchdog_module.compute_poll_schedule(durations))
+
+
+def test_spread_durations_cover_the_distribution(watchdog_module):
+    durations = [1, 5, 9, 30, 31, 32, 60]
+    schedule = watchdog_module.compute_poll_schedule(durations)
+    assert_valid_schedule(watchdog_module, schedule)
+    assert schedule[-1] >= max(durations)
+
+
+def test_log_lines_are_formatted_once(watchdog_module, watchdog_dir):
+    logging.getLogger().info("Detected new file: %s", "x")
+    # Stopping the listener drains the queue; restart it for the atexit hook
+    watchdog_module.log_listener.stop()
+    watchdog_module.log_listener.start()
+    last_line = (watchdog_dir / "file_watcher.log").read_text().splitlines()[-1]
+    assert re.fullmatch(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} - INFO - Detected new file: x", last_line)
+
+
+def test_queued_file_is_confirmed_on_fixed_interval(watchdog_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(watchdog_module, "HISTORY_FILE", str(tmp_path / "history.pkl"))
+    monkeypatch.setattr(watchdog_module, "MIN_FILE_AGE", 0)
+    monkeypatch.setattr(watchdog_module, "INITIAL_CHECK_INTERVAL", 0.05)
+    monkeypatch.setattr(watchdog_module, "CONFIRM_INTERVAL", 0.1)
+    monkeypatch.setattr(watchdog_module, "compute_poll_schedule", lambda durations: [10.0, 20.0, 30.5, 60.0])
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"data")
+
+    handler = watchdog_module.RobustFolderWatchHandler(str(path), True)
+    detected_at = time.time() - 30
+    started = time.monotonic()
+    assert handler.wait_for_stable_file(str(path), detected_at)
+    elapsed = time.monotonic() - started
+    handler.executor.shutdown()
+
+    # Points that passed in the queue are skipped, the next one finds the file
+    # unchanged and the remaining confirmations follow at CONFIRM_INTERVAL
+    confirmations = watchdog_module.STABLE_CONFIRMATIONS
+    assert 0.5 + (confirmations - 1) * 0.1 - 0.05 <= elapsed < 2
+    (_, duration), = watchdog_module.load_history()[".mp4"]
+    assert duration > 0